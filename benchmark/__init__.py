@@ -0,0 +1,4 @@
+"""
+Reproducible benchmarks of library operations.
+Run from repository root: python -m benchmark --help
+"""
@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import platform
+import tempfile
+
+import config
+import media_library
+from benchmark import suite, synthetic
+from benchmark.timing import git_commit, peak_rss_kb
+
+
+def parse_sizes(value: str) -> tuple:
+    """
+    "2048:30,32768:70" -> ((2048, 30), (32768, 70))
+    """
+    return tuple(tuple(int(x) for x in item.split(":")) for item in value.split(","))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Benchmark library operations.")
+    parser.add_argument("--media", type=int, default=10000, help="medias in the synthetic library")
+    parser.add_argument("--series", type=int, default=100, help="series in the synthetic library")
+    parser.add_argument("--series-fraction", type=float, default=0.5, help="fraction of medias in a series")
+    parser.add_argument("--tags", type=int, default=1000, help="distinct tags in the synthetic library")
+    parser.add_argument("--tags-per-media", type=int, default=3)
+    parser.add_argument("--sizes", type=parse_sizes, default=None,
+                        help="file size distribution as size:weight,... in bytes")
+    parser.add_argument("--samples", type=int, default=200, help="operations timed per scenario")
+    parser.add_argument("--bulk", type=int, default=1000, help="medias added by the bulk ingest scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="where to build libraries, defaults to a temp dir")
+    parser.add_argument("--keep", action="store_true", help="do not delete the working directory")
+    parser.add_argument("--instrument", action="store_true", help="include Library.stats() in the report")
+    parser.add_argument("--output", "-o", default=None, help="write JSON report to file instead of stdout")
+    args = parser.parse_args(argv)
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="shiromana-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    gen = synthetic.Generator(args.seed, args.sizes)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": sys.version,
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "time": time.time(),
+            "params": {k: v for (k, v) in vars(args).items() if k not in ("workdir", "keep", "output")}
+        },
+        "results": {}
+    }
+    results = report["results"]
+
+    try:
+        media_library.create_library(workdir, "bench")
+        lib_path = os.path.join(workdir, "bench" + config.LIBRARY_EXT)
+        start = time.perf_counter()
+        series = synthetic.fill_library(lib_path, gen, args.media, args.series, args.series_fraction,
+                                        args.tags, args.tags_per_media)
+        report["meta"]["fill_seconds"] = time.perf_counter() - start
+        single_files = gen.write_files(os.path.join(workdir, "single"), args.samples)
+        bulk_files = gen.write_files(os.path.join(workdir, "bulk"), args.bulk)
+
+        ctx = suite.Context(workdir, lib_path, args.media, series, args.seed, args.samples, args.instrument)
+        ctx.open()
+        results["create_library"] = suite.bench_create_library(ctx)
+        results["open_library"] = suite.bench_open_library(ctx)
+        results["startup"] = suite.bench_startup(ctx)
+        results["startup_read_only"] = suite.bench_startup(ctx, read_only=True)
+        results["add_media"] = suite.bench_add_media(ctx, single_files)
+        results["add_media_bulk"] = suite.bench_add_media(ctx, bulk_files)
+        results["get_media"] = suite.bench_get_media(ctx)
+        results["add_to_series"] = suite.bench_add_to_series(ctx)
+        results["update_series_no"] = suite.bench_update_series_no(ctx)
+        results["trim_series_no"] = suite.bench_trim_series_no(ctx)
+        results["remove_media"] = suite.bench_remove_media(ctx)
+        if args.instrument:
+            report["stats"] = ctx.lib.stats()
+        ctx.close()
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    report["meta"]["peak_rss_kb"] = peak_rss_kb()
+
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == '__main__':
+    main()
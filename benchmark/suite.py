@@ -0,0 +1,140 @@
+"""
+This file provides benchmark scenarios of library operations.
+Each scenario returns a summary produced by timing.summarize.
+"""
+import os
+import time
+import shutil
+import random
+
+import media_library
+from media import MediaType
+from benchmark.timing import Timer
+
+
+class Context:
+    """
+    State shared between scenarios: a filled library and what was put into it.
+    """
+    workdir: str = None
+    lib_path: str = None
+    lib: media_library.Library = None
+    media_count = 0
+    series: dict = None  # series uuid -> next free series no
+    added: list = None  # ids of medias added by ingest scenarios
+    in_series: list = None  # (media id, series uuid, series no) added by add_to_series scenario
+    rng: random.Random = None
+    samples = 0
+    instrument = False
+
+    def __init__(self, workdir: str, lib_path: str, media_count: int, series: dict, seed: int, samples: int,
+                 instrument: bool = False):
+        self.workdir = workdir
+        self.lib_path = lib_path
+        self.media_count = media_count
+        self.series = series
+        self.added = []
+        self.in_series = []
+        self.rng = random.Random(seed)
+        self.samples = samples
+        self.instrument = instrument
+
+    def open(self):
+        self.lib = media_library.open_library(self.lib_path)
+        if self.instrument:
+            self.lib.enable_stats()
+
+    def close(self):
+        # Library releases its lock on deletion
+        self.lib = None
+
+
+def bench_create_library(ctx: Context) -> dict:
+    path = os.path.join(ctx.workdir, "create")
+    os.makedirs(path, exist_ok=True)
+    timer = Timer()
+    for i in range(ctx.samples):
+        timer(media_library.create_library, path, "bench_" + str(i))
+    shutil.rmtree(path)
+    return timer.summary()
+
+
+def bench_open_library(ctx: Context) -> dict:
+    ctx.close()
+    timer = Timer()
+    for _ in range(ctx.samples):
+        lib = timer(media_library.open_library, ctx.lib_path)
+        del lib
+    ctx.open()
+    return timer.summary()
+
+
+def bench_startup(ctx: Context, read_only: bool = False) -> dict:
+    """
+    Time from open_library to the first get_media result, as seen by a short-lived consumer.
+    """
+    ctx.close()
+    timer = Timer()
+    for _ in range(ctx.samples):
+        media_id = ctx.rng.randint(1, ctx.media_count)
+        start = time.perf_counter()
+        lib = media_library.open_library(ctx.lib_path, read_only)
+        lib.get_media(media_id)
+        timer.samples.append(time.perf_counter() - start)
+        del lib
+    ctx.open()
+    return timer.summary()
+
+
+def bench_add_media(ctx: Context, files: list) -> dict:
+    timer = Timer()
+    start = time.perf_counter()
+    for fp in files:
+        ctx.added.append(timer(ctx.lib.add_media, fp, MediaType.Image).id)
+    return timer.summary(time.perf_counter() - start)
+
+
+def bench_get_media(ctx: Context) -> dict:
+    timer = Timer()
+    for _ in range(ctx.samples):
+        timer(ctx.lib.get_media, ctx.rng.randint(1, ctx.media_count))
+    return timer.summary()
+
+
+def bench_add_to_series(ctx: Context) -> dict:
+    timer = Timer()
+    if not ctx.series:
+        return timer.summary()
+    for media_id in ctx.added[:ctx.samples]:
+        series_uuid = ctx.rng.choice(list(ctx.series.keys()))
+        series_no = ctx.series[series_uuid]
+        ctx.series[series_uuid] += 1
+        timer(ctx.lib.add_to_series, media_id, series_uuid, series_no)
+        ctx.in_series.append((media_id, series_uuid, series_no))
+    return timer.summary()
+
+
+def bench_update_series_no(ctx: Context) -> dict:
+    timer = Timer()
+    for (media_id, _, series_no) in ctx.in_series:
+        # media holding no 1 was first in a series without filled medias, moving it to 1 is a plain update
+        if series_no == 1:
+            continue
+        # otherwise no 1 is occupied, so the call shifts the whole series
+        timer(ctx.lib.update_series_no, media_id, 1, True)
+    return timer.summary()
+
+
+def bench_trim_series_no(ctx: Context) -> dict:
+    timer = Timer()
+    for series_uuid in {x[1] for x in ctx.in_series}:
+        timer(ctx.lib.trim_series_no, series_uuid)
+    return timer.summary()
+
+
+def bench_remove_media(ctx: Context) -> dict:
+    timer = Timer()
+    ids = ctx.rng.sample(range(1, ctx.media_count + 1), min(ctx.samples, ctx.media_count))
+    for media_id in ids:
+        timer(ctx.lib.remove_media, media_id)
+    return timer.summary()
@@ -0,0 +1,123 @@
+"""
+This file generates synthetic medias and libraries for benchmark.
+Everything is derived from a seed, so the same parameters give the same library (except add time).
+"""
+import os
+import uuid
+import random
+import hashlib
+import sqlite3
+
+import config
+from media import MediaType
+
+# (size in bytes, weight), mixed small pictures and some large files
+DEFAULT_SIZES = ((2 * 1024, 30), (32 * 1024, 40), (256 * 1024, 25), (2 * 1024 * 1024, 5))
+FILL_BATCH = 10000
+
+
+class Generator:
+    rng: random.Random = None
+    sizes: tuple = DEFAULT_SIZES
+    counter = 0
+
+    def __init__(self, seed: int, sizes: tuple = None):
+        self.rng = random.Random(seed)
+        if sizes is not None:
+            self.sizes = sizes
+
+    def size(self) -> int:
+        return self.rng.choices([x[0] for x in self.sizes], [x[1] for x in self.sizes])[0]
+
+    def uuid(self) -> str:
+        """
+        Seeded replacement of media_library.gen_uuid, which is time based.
+        """
+        return str(uuid.UUID(int=self.rng.getrandbits(128))).upper()
+
+    def stub(self) -> bytes:
+        """
+        Tiny unique content, used for pre-filled medias whose file only has to exist.
+        """
+        self.counter += 1
+        return self.counter.to_bytes(8, "little")
+
+    def content(self) -> bytes:
+        size = self.size()
+        # counter prefix keeps hashes unique even when random bytes repeat
+        prefix = self.stub()
+        return prefix + self.rng.randbytes(max(size - len(prefix), 0))
+
+    def write_files(self, path: str, count: int, ext: str = ".jpg") -> list:
+        """
+        :return: paths of generated media files
+        """
+        os.makedirs(path, exist_ok=True)
+        ret = []
+        for _ in range(count):
+            fp = os.path.join(path, "{:08d}{}".format(self.counter + 1, ext))
+            with open(fp, "wb") as f:
+                f.write(self.content())
+            ret.append(fp)
+        return ret
+
+
+def fill_library(lib_path: str, gen: Generator, media_count: int, series_count: int, series_fraction: float,
+                 tag_count: int, tags_per_media: int, ext: str = ".jpg") -> dict:
+    """
+    Populate a library directly through its database and medias folder,
+    bypassing add_media to make libraries with millions of medias feasible.
+    Stored files are tiny stubs, only the filesize in database follows the size
+    distribution, so millions of medias do not need the disk space of real ones.
+    :return: series uuid -> next free series no
+    """
+    series = {gen.uuid(): 1 for _ in range(series_count)}
+    series_list = list(series.keys())
+    tags = [gen.uuid() for _ in range(tag_count)]
+    medias_path = os.path.join(lib_path, config.MEDIAS_FOLDER)
+    hash_func = getattr(hashlib, config.HASH_ALGO.lower())
+
+    conn = sqlite3.connect(os.path.join(lib_path, config.DATABASE_FN))
+    conn.executemany(
+        "INSERT INTO series (uuid, caption, comment, media_count) VALUES (?,?,?,?);",
+        [(x, "Series " + str(i), "", 0) for (i, x) in enumerate(series_list)]
+    )
+    series_size = {x: 0 for x in series_list}
+    done = 0
+    while done < media_count:
+        media_rows = []
+        tag_rows = []
+        for _ in range(min(FILL_BATCH, media_count - done)):
+            done += 1
+            data = gen.stub()
+            file_hash = hash_func(data).hexdigest().upper()
+            os.makedirs(os.path.join(medias_path, file_hash[:2]), exist_ok=True)
+            with open(os.path.join(medias_path, file_hash[:2], file_hash[2:] + ext), "wb") as f:
+                f.write(data)
+            series_uuid = None
+            series_no = None
+            if series_list and gen.rng.random() < series_fraction:
+                series_uuid = gen.rng.choice(series_list)
+                series_no = series[series_uuid]
+                series[series_uuid] += 1
+                series_size[series_uuid] += 1
+            media_rows.append((done, file_hash, "{:08d}{}".format(done, ext), gen.size(),
+                               MediaType.Image.value, series_uuid, series_no))
+            for tag in gen.rng.sample(tags, min(tags_per_media, len(tags))):
+                tag_rows.append((done, tag))
+        conn.executemany(
+            """
+            INSERT INTO media (id, hash, filename, filesize, type, series_uuid, series_no)
+            VALUES (?,?,?,?,?,?,?);
+            """,
+            media_rows
+        )
+        conn.executemany("INSERT INTO media_tags_ref (media_id, tags_uuid) VALUES (?,?);", tag_rows)
+        conn.commit()
+    conn.executemany(
+        "UPDATE series SET media_count = ? WHERE uuid = ?;",
+        [(n, x) for (x, n) in series_size.items()]
+    )
+    conn.commit()
+    conn.close()
+    return series
@@ -0,0 +1,78 @@
+"""
+This file provides helpers to time operations and summarize the samples.
+"""
+import os
+import sys
+import time
+import resource
+import subprocess
+
+
+def peak_rss_kb() -> int:
+    """
+    High-water mark of the whole process, including library fill, not of a single scenario.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":  # bytes on macOS, kilobytes elsewhere
+        rss //= 1024
+    return rss
+
+
+def percentile(sorted_samples: list, p: float) -> float:
+    if not sorted_samples:
+        return None
+    k = (len(sorted_samples) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+
+def summarize(samples: list, wall: float = None) -> dict:
+    """
+    :param samples: latency of each operation in seconds
+    :param wall: total elapsed seconds, defaults to sum of samples
+    :return: throughput and latency percentiles
+    """
+    s = sorted(samples)
+    if wall is None:
+        wall = sum(s)
+    return {
+        "ops": len(s),
+        "seconds": wall,
+        "ops_per_sec": len(s) / wall if wall else None,
+        "latency": {
+            "mean": sum(s) / len(s) if s else None,
+            "min": s[0] if s else None,
+            "p50": percentile(s, 50),
+            "p90": percentile(s, 90),
+            "p99": percentile(s, 99),
+            "max": s[-1] if s else None
+        }
+    }
+
+
+class Timer:
+    samples: list = None
+
+    def __init__(self):
+        self.samples = []
+
+    def __call__(self, func, *args, **kwargs):
+        start = time.perf_counter()
+        ret = func(*args, **kwargs)
+        self.samples.append(time.perf_counter() - start)
+        return ret
+
+    def summary(self, wall: float = None) -> dict:
+        return summarize(self.samples, wall)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
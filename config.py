@@ -10,6 +10,8 @@ MEDIAS_HASH_LEVEL = 1
 MEDIAS_FOLDER_MAX_FILES = 10000  # only for warning
 HASH_ALGO = "MD5"
 LOCKFILE = ".LOCK"
+SLOW_QUERY_THRESHOLD = 0.1  # in seconds, only when instrumentation enabled
+PROGRESS_HANDLER_STEPS = 10000  # sqlite VM instructions between progress callbacks
 
 
 # Type is composed with MainType, SubType, TypeAddition
@@ -0,0 +1,260 @@
+"""
+This file provides opt-in instrumentation for library operations.
+Latency of public methods, internal phases and SQL statements is collected
+into histograms, so that slow operations could be told apart (CPU, disk or DB).
+"""
+import time
+import json
+import bisect
+import logging
+import sqlite3
+import functools
+from contextlib import contextmanager, nullcontext
+from collections import deque
+
+import config
+
+logger = logging.getLogger("shiromana.instrument")
+
+# Upper bounds of latency histogram buckets in seconds, an extra +Inf bucket is implied
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+SLOW_QUERY_LOG_SIZE = 100
+
+# Shared no-op context manager, used when instrumentation is disabled
+NULL_PHASE = nullcontext()
+
+
+def timed(func):
+    """
+    Record latency of a Library method. Does nothing but one attribute lookup
+    when instrumentation of the library is disabled.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        stats = self._stats
+        if stats is None:
+            return func(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            stats.observe("method", name, time.perf_counter() - start)
+
+    return wrapper
+
+
+class Histogram:
+    count = 0
+    total = 0.0
+    min: float = None
+    max: float = None
+    buckets: list = None
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "buckets": {
+                **{str(le): n for (le, n) in zip(LATENCY_BUCKETS, self.buckets)},
+                "+Inf": self.buckets[-1]
+            }
+        }
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Time each statement from execute until its rows are exhausted.
+    sqlite only steps to the first row in execute, the rest of a scan runs while fetching.
+    """
+    stats = None
+    _pending: list = None  # [sql, parameters, seconds] of statement with rows left to fetch
+
+    def _finish(self):
+        if self._pending is not None:
+            (sql, parameters, seconds) = self._pending
+            self._pending = None
+            self.stats.observe_query(sql, parameters, seconds)
+
+    def _add(self, seconds: float):
+        if self._pending is not None:
+            self._pending[2] += seconds
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            ret = super().execute(sql, parameters)
+        except BaseException:
+            self._pending = [sql, parameters, time.perf_counter() - start]
+            self._finish()
+            raise
+        self._pending = [sql, parameters, time.perf_counter() - start]
+        if self.description is None:  # statement returns no rows
+            self._finish()
+        return ret
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._add(time.perf_counter() - start)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size: int = None):
+        if size is None:
+            size = self.arraysize
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._add(time.perf_counter() - start)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._add(time.perf_counter() - start)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._add(time.perf_counter() - start)
+            self._finish()
+            raise
+        self._add(time.perf_counter() - start)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+
+class Stats:
+    slow_query_threshold: float = config.SLOW_QUERY_THRESHOLD
+    progress_steps: int = config.PROGRESS_HANDLER_STEPS
+    histograms: dict = None  # (kind, name) -> Histogram
+    counters: dict = None
+    slow_queries: deque = None
+
+    def __init__(self, slow_query_threshold: float = None, progress_steps: int = None):
+        if slow_query_threshold is not None:
+            self.slow_query_threshold = slow_query_threshold
+        if progress_steps is not None:
+            self.progress_steps = progress_steps
+        self.histograms = {}
+        self.counters = {}
+        self.slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+    def observe(self, kind: str, name: str, seconds: float):
+        key = (kind, name)
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram()
+        hist.observe(seconds)
+
+    def incr(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("phase", name, time.perf_counter() - start)
+
+    def observe_query(self, sql: str, parameters, seconds: float):
+        statement = " ".join(sql.split())
+        self.observe("query", statement, seconds)
+        if seconds >= self.slow_query_threshold:
+            self.incr("slow_queries")
+            self.slow_queries.append({
+                "statement": statement,
+                "parameters": repr(parameters),
+                "seconds": seconds,
+                "time": time.time()
+            })
+            logger.warning("Slow query (%.3fs): %s %r", seconds, statement, parameters)
+
+    def cursor(self, conn: sqlite3.Connection) -> sqlite3.Cursor:
+        cur = conn.cursor(TimedCursor)
+        cur.stats = self
+        return cur
+
+    def _trace(self, statement: str):
+        # Called by sqlite for every statement, including implicit BEGIN and COMMIT
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        self.incr("statements." + verb)
+
+    def _progress(self) -> int:
+        self.incr("vm_steps", self.progress_steps)
+        return 0
+
+    def attach(self, conn: sqlite3.Connection):
+        conn.set_trace_callback(self._trace)
+        conn.set_progress_handler(self._progress, self.progress_steps)
+
+    @staticmethod
+    def detach(conn: sqlite3.Connection):
+        conn.set_trace_callback(None)
+        conn.set_progress_handler(None, 0)
+
+    def snapshot(self) -> dict:
+        ret = {
+            "method": {},
+            "phase": {},
+            "query": {},
+            "counters": dict(self.counters),
+            "slow_queries": list(self.slow_queries)
+        }
+        for ((kind, name), hist) in self.histograms.items():
+            ret[kind][name] = hist.to_dict()
+        return ret
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        lines = [
+            "# HELP shiromana_latency_seconds Latency of library operations.",
+            "# TYPE shiromana_latency_seconds histogram"
+        ]
+        for ((kind, name), hist) in self.histograms.items():
+            labels = 'kind="{}",name="{}"'.format(kind, _escape_label(name))
+            cumulative = 0
+            for (le, n) in zip(LATENCY_BUCKETS + ("+Inf",), hist.buckets):
+                cumulative += n
+                lines.append('shiromana_latency_seconds_bucket{{{},le="{}"}} {}'.format(labels, le, cumulative))
+            lines.append("shiromana_latency_seconds_sum{{{}}} {}".format(labels, hist.total))
+            lines.append("shiromana_latency_seconds_count{{{}}} {}".format(labels, hist.count))
+        lines.append("# HELP shiromana_events_total Counters of library events.")
+        lines.append("# TYPE shiromana_events_total counter")
+        for (name, value) in self.counters.items():
+            lines.append('shiromana_events_total{{name="{}"}} {}'.format(_escape_label(name), value))
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -9,10 +9,12 @@ import sqlite3
 import json
 import hashlib
 import shutil
+import pathlib
 import random
 from typing import Union
 
 import config
+import instrument
 from media import Media, MediaType
 
 
@@ -115,40 +117,47 @@ def create_library(path: str, lib_name: str, master_name: str = "", local_name:
     config.release_lock(library_path)
 
 
-def open_library(path: str):
+def open_library(path: str, read_only: bool = False):
+    """
+    Database is connected on first use, so opening costs the same for any library size.
+    :param path: path to library
+    :param read_only: open without acquiring lock, nothing could be written. The database is opened
+        as immutable, which is only valid while nothing writes to the library; if a writer holds the
+        lock at connection time, plain read-only mode is used instead. A writer opening the library
+        after that is not detected.
+    """
     if not os.path.exists(path):
         raise Exception("Not Exists")
-    if not all(i in os.listdir(path) for i in
-               [config.FINGERPRINT_FN, config.DATABASE_FN, config.METADATA_FN,
-                config.MEDIAS_FOLDER]):
+    if not (all(os.path.isfile(os.path.join(path, i)) for i in
+                [config.FINGERPRINT_FN, config.DATABASE_FN, config.METADATA_FN])
+            and os.path.isdir(os.path.join(path, config.MEDIAS_FOLDER))):
         raise Exception("Not Library")
 
-    if not config.acquire_lock(path):
+    if not read_only and not config.acquire_lock(path):
         raise Exception("Open failed: Cannot acquire lock.")
 
-    cwd = os.getcwd()
-    os.chdir(path)
-
     library_metadata = {}
-    with open(config.METADATA_FN, "r") as f:
+    with open(os.path.join(path, config.METADATA_FN), "r") as f:
         library_metadata = json.load(f)
 
     library_uuid = ""
-    with open(config.FINGERPRINT_FN, "r") as f:
+    with open(os.path.join(path, config.FINGERPRINT_FN), "r") as f:
         library_uuid = f.read(36)
     if library_metadata['UUID'].strip() != library_uuid:
+        if not read_only:
+            config.release_lock(path)
         raise Exception("UUID Mismatch")
 
     lib = Library()
     lib.path = path
+    lib.read_only = read_only
     lib.library_name = library_metadata['library_name']
     lib.local_name = library_metadata['local_name']
     lib.master_name = library_metadata['master_name']
     lib.uuid = library_metadata['UUID']
     lib.schema = library_metadata['schema']
     lib.summary = LibrarySummary.from_dict(library_metadata['summary'])
-    lib.db = sqlite3.connect(config.DATABASE_FN)
-    os.chdir(cwd)
+    lib._db_path = os.path.abspath(os.path.join(path, config.DATABASE_FN))
     return lib
 
 
@@ -184,24 +193,113 @@ class LibrarySummary:
 
 
 class Library:
-    db: sqlite3.Connection = None
+    _db: sqlite3.Connection = None
+    _db_path: str = None
     shared_db: sqlite3.Connection = None
     path: str = None
+    read_only: bool = False
     summary: LibrarySummary = LibrarySummary()
     uuid: str = None
     master_name: str = None
     local_name: str = None
     library_name: str = None
     schema: str = None
+    _stats: instrument.Stats = None
 
     def __init__(self):
         pass
 
     def __del__(self):
-        self.db.commit()
-        self.db.close()
-        config.release_lock(self.path)
+        if self._db is not None:
+            if not self.read_only:
+                self._db.commit()
+            self._db.close()
+        if not self.read_only:
+            config.release_lock(self.path)
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """
+        Connect to database and check its schema on first access.
+        """
+        if self._db is None:
+            if self.read_only:
+                uri = pathlib.Path(self._db_path).as_uri() + "?mode=ro"
+                # immutable skips all locking and change detection, unsafe while a writer is open
+                if not os.path.exists(os.path.join(os.path.dirname(self._db_path), config.LOCKFILE)):
+                    uri += "&immutable=1"
+                conn = sqlite3.connect(uri, uri=True)
+            else:
+                conn = sqlite3.connect(self._db_path)
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'media';").fetchone() is None:
+                conn.close()
+                raise Exception("Not Library")
+            if self._stats is not None:
+                self._stats.attach(conn)
+            self._db = conn
+        return self._db
+
+    def enable_stats(self, slow_query_threshold: float = None):
+        """
+        Start collecting timings and counters. Disabled by default.
+        :param slow_query_threshold: statements slower than this (in seconds) are logged
+        """
+        if self._stats is not None and self._db is not None:
+            instrument.Stats.detach(self._db)
+        self._stats = instrument.Stats(slow_query_threshold)
+        if self._db is not None:
+            self._stats.attach(self._db)
+
+    def disable_stats(self):
+        if self._stats is None:
+            return
+        if self._db is not None:
+            instrument.Stats.detach(self._db)
+        self._stats = None
+
+    def stats(self) -> dict:
+        """
+        :return: snapshot of collected timings and counters, empty if instrumentation is disabled
+        """
+        if self._stats is None:
+            return {}
+        return self._stats.snapshot()
+
+    def dump_stats(self, fmt: str = "json") -> str:
+        """
+        :param fmt: "json" or "prometheus"
+        :return: collected stats in requested text format
+        """
+        if self._stats is None:
+            raise Exception("Stats not enabled")
+        if fmt == "json":
+            return self._stats.to_json()
+        if fmt == "prometheus":
+            return self._stats.to_prometheus()
+        raise Exception("Unknown stats format: " + fmt)
+
+    def _check_writable(self):
+        if self.read_only:
+            raise Exception("Library opened read-only")
+
+    def _cursor(self) -> sqlite3.Cursor:
+        if self._stats is None:
+            return self.db.cursor()
+        return self._stats.cursor(self.db)
+
+    def _commit(self):
+        if self._stats is None:
+            self.db.commit()
+            return
+        with self._stats.phase("commit"):
+            self.db.commit()
+
+    def _phase(self, name: str):
+        if self._stats is None:
+            return instrument.NULL_PHASE
+        return self._stats.phase(name)
 
+    @instrument.timed
     def add_media(self, path: str, kind: MediaType, sub_kind: str = None, kind_addition: str = None, caption=None,
                   comment: str = None) -> Media:
         """
@@ -213,11 +311,12 @@ class Library:
         :param comment: media comment
         :return: integer for media id used for index media
         """
+        self._check_writable()
         ori_kind = kind
         kind = kind.value
         if not os.path.isfile(path):
             raise Exception("Not Exists or Not a File")
-        with open(path, "rb") as f:
+        with self._phase("hash"), open(path, "rb") as f:
             file_hash = getattr(hashlib, config.HASH_ALGO.lower())(f.read()).hexdigest().upper()
         filename = os.path.basename(path)
         ext = os.path.splitext(path)[-1]
@@ -226,26 +325,28 @@ class Library:
         if os.path.exists(new_path):
             raise Exception("Already Exists")
         os.makedirs(self.path + '/' + config.MEDIAS_FOLDER + '/' + file_hash[:2], exist_ok=True)
-        shutil.copy(path, new_path)
-        cur = self.db.cursor()
+        with self._phase("copy"):
+            shutil.copy(path, new_path)
+        cur = self._cursor()
         filesize = os.path.getsize(new_path)
-        cur.execute(
-            """
-            INSERT INTO media (hash, filename, filesize, caption, type, sub_type, type_addition, comment)
-            VALUES (?,?,?,?,?,?,?,?);
-            """,
-            (file_hash, filename, filesize, caption, kind, sub_kind, kind_addition, comment)
-        )
-        id = cur.lastrowid
-        cur.execute(
-            """
-            SELECT time_add FROM media WHERE id = ?;
-            """,
-            (id,)
-        )
-        time_add = cur.fetchall()[0][0]
+        with self._phase("insert"):
+            cur.execute(
+                """
+                INSERT INTO media (hash, filename, filesize, caption, type, sub_type, type_addition, comment)
+                VALUES (?,?,?,?,?,?,?,?);
+                """,
+                (file_hash, filename, filesize, caption, kind, sub_kind, kind_addition, comment)
+            )
+            id = cur.lastrowid
+            cur.execute(
+                """
+                SELECT time_add FROM media WHERE id = ?;
+                """,
+                (id,)
+            )
+            time_add = cur.fetchall()[0][0]
         cur.close()
-        self.db.commit()
+        self._commit()
         return Media.from_dict(
             {
                 "id": id,
@@ -264,14 +365,16 @@ class Library:
             self
         )
 
+    @instrument.timed
     def remove_media(self, id: Union[Media, int]):
         """
         :param id: media id
         :return: None
         """
+        self._check_writable()
         if isinstance(id, Media):
             id = id.id
-        cur = self.db.cursor()
+        cur = self._cursor()
         cur.execute(
             """
             SELECT hash, filename FROM media WHERE id = ?;
@@ -290,18 +393,20 @@ class Library:
             (id,)
         )
         cur.close()
-        self.db.commit()
+        self._commit()
         os.remove(fp)
 
+    @instrument.timed
     def update_media(self, id: Union[Media, int], new: dict):
         """
         :param id: media id
         :param new: data to be updated, key is database's key
         :return: None
         """
+        self._check_writable()
         if isinstance(id, Media):
             id = id.id
-        cur = self.db.cursor()
+        cur = self._cursor()
         for (key, value) in new.items():
             if key not in ["filename", "caption", "type", "sub_type", "type_addition", "comment"]:
                 continue
@@ -314,15 +419,17 @@ class Library:
                 (value, id)
             )
         cur.close()
-        self.db.commit()
+        self._commit()
 
+    @instrument.timed
     def create_series(self, caption: str = "", comment: str = "") -> str:
         """
         :param caption: series' caption
         :param comment: series' comment
         :return: series' uuid
         """
-        cur = self.db.cursor()
+        self._check_writable()
+        cur = self._cursor()
         uuid = gen_uuid()
         cur.execute(
             """
@@ -332,11 +439,13 @@ class Library:
             (uuid, caption, comment, 0)
         )
         cur.close()
-        self.db.commit()
+        self._commit()
         return uuid
 
+    @instrument.timed
     def delete_series(self, uuid: str):
-        cur = self.db.cursor()
+        self._check_writable()
+        cur = self._cursor()
         cur.execute(
             """
             DELETE FROM series WHERE uuid = ?;
@@ -351,12 +460,14 @@ class Library:
             """,
             (uuid,)
         )
-        self.db.commit()
+        self._commit()
 
+    @instrument.timed
     def add_to_series(self, media_id: Union[Media, int], series_uuid: str, media_no: int = None):
+        self._check_writable()
         if isinstance(media_id, Media):
             media_id = media_id.id
-        cur = self.db.cursor()
+        cur = self._cursor()
         cur.execute(
             """
             SELECT series_no FROM media WHERE series_uuid = ? AND id != ?;
@@ -385,14 +496,16 @@ class Library:
             (series_uuid,)
         )
         cur.close()
-        self.db.commit()
+        self._commit()
 
+    @instrument.timed
     def remove_from_series(self, media_id: Union[Media, int]):
+        self._check_writable()
         if isinstance(media_id, Media):
             media_id = media_id.id
         if isinstance(media_id, Media):
             media_id = media_id.id
-        cur = self.db.cursor()
+        cur = self._cursor()
         cur.execute(
             """
             SELECT series_uuid FROM media WHERE id = ?;
@@ -420,12 +533,14 @@ class Library:
             (series_uuid,)
         )
         cur.close()
-        self.db.commit()
+        self._commit()
 
+    @instrument.timed
     def update_series_no(self, media_id: Union[Media, int], media_no: int, insert: bool = False):
+        self._check_writable()
         if isinstance(media_id, Media):
             media_id = media_id.id
-        cur = self.db.cursor()
+        cur = self._cursor()
         cur.execute(
             """
             SELECT series_uuid FROM media WHERE id = ?;
@@ -474,13 +589,15 @@ class Library:
                 )
 
         cur.close()
-        self.db.commit()
+        self._commit()
 
+    @instrument.timed
     def trim_series_no(self, series_uuid: str):
         """
         Dude, you should rarely use this function for the GOD's sake.
         """
-        cur = self.db.cursor()
+        self._check_writable()
+        cur = self._cursor()
         cur.execute(
             """
             SELECT id, series_no FROM media WHERE series_uuid = ?;
@@ -500,8 +617,9 @@ class Library:
                 (media_no, media_id)
             )
         cur.close()
-        self.db.commit()
+        self._commit()
 
+    @instrument.timed
     def get_media(self, media_id: Union[Media, int]) -> Media:
         """
         :param media_id: when you pass media_id as Media, we do query from the database again
@@ -509,7 +627,7 @@ class Library:
         """
         if isinstance(media_id, Media):
             media_id = media_id.id
-        cur = self.db.cursor()
+        cur = self._cursor()
         cur.execute(
             """
             SELECT * FROM media WHERE id = ?;
@@ -0,0 +1,114 @@
+import os
+import json
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import config
+import instrument
+import media_library
+from media import MediaType
+
+SLOW_QUERY_THRESHOLD = 0.001
+SCAN = "SELECT id, value FROM big WHERE value % 2 = 0;"
+
+
+class TimedCursorTest(unittest.TestCase):
+    conn: sqlite3.Connection = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = sqlite3.connect(":memory:")
+        cls.conn.execute("CREATE TABLE big(id INTEGER PRIMARY KEY, value INTEGER NOT NULL);")
+        cls.conn.executemany("INSERT INTO big (value) VALUES (?);", ((i,) for i in range(300000)))
+        cls.conn.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+
+    def setUp(self):
+        self.stats = instrument.Stats(slow_query_threshold=SLOW_QUERY_THRESHOLD)
+
+    def assert_scan_is_slow(self, rows: int):
+        self.assertEqual(rows, 150000)
+        query = self.stats.snapshot()["query"][SCAN]
+        self.assertEqual(query["count"], 1)
+        self.assertGreaterEqual(query["total"], SLOW_QUERY_THRESHOLD)
+        self.assertEqual([x["statement"] for x in self.stats.slow_queries], [SCAN])
+
+    def test_fetchall_time_is_counted(self):
+        cur = self.stats.cursor(self.conn)
+        cur.execute(SCAN)
+        self.assert_scan_is_slow(len(cur.fetchall()))
+
+    def test_iteration_time_is_counted(self):
+        cur = self.stats.cursor(self.conn)
+        self.assert_scan_is_slow(sum(1 for _ in cur.execute(SCAN)))
+
+    def test_statement_without_rows_is_recorded_at_once(self):
+        cur = self.stats.cursor(self.conn)
+        cur.execute("UPDATE big SET value = value WHERE id = ?;", (1,))
+        self.assertEqual(self.stats.snapshot()["query"]["UPDATE big SET value = value WHERE id = ?;"]["count"], 1)
+
+
+class LibraryStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        media_library.create_library(self.tmp, "test")
+        self.lib = media_library.open_library(os.path.join(self.tmp, "test" + config.LIBRARY_EXT))
+        self.media_path = os.path.join(self.tmp, "1.jpg")
+        with open(self.media_path, "wb") as f:
+            f.write(b"not really a jpeg")
+
+    def tearDown(self):
+        # Library releases its lock on deletion
+        self.lib = None
+        shutil.rmtree(self.tmp)
+
+    def test_disabled_by_default(self):
+        self.assertEqual(self.lib.stats(), {})
+        with self.assertRaises(Exception):
+            self.lib.dump_stats()
+
+    def test_methods_and_phases(self):
+        self.lib.enable_stats()
+        media = self.lib.add_media(self.media_path, MediaType.Image)
+        self.lib.get_media(media.id)
+        stats = self.lib.stats()
+        self.assertEqual(stats["method"]["add_media"]["count"], 1)
+        self.assertEqual(stats["method"]["get_media"]["count"], 1)
+        self.assertTrue({"hash", "copy", "insert", "commit"} <= set(stats["phase"]))
+        self.assertGreater(stats["counters"]["statements.INSERT"], 0)
+        self.assertEqual(json.loads(self.lib.dump_stats("json"))["method"].keys(), stats["method"].keys())
+
+    def test_prometheus_buckets_are_cumulative(self):
+        self.lib.enable_stats()
+        for _ in range(3):
+            self.lib.create_series()
+        text = self.lib.dump_stats("prometheus")
+        labels = 'kind="method",name="create_series"'
+        buckets = [int(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+                   if line.startswith("shiromana_latency_seconds_bucket{" + labels + ",")]
+        self.assertEqual(len(buckets), len(instrument.LATENCY_BUCKETS) + 1)
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], 3)
+        self.assertIn("shiromana_latency_seconds_count{" + labels + "} 3", text)
+        self.assertTrue(any(line.startswith("shiromana_latency_seconds_sum{" + labels + "} ")
+                            for line in text.splitlines()))
+
+    def test_disable_detaches_callbacks(self):
+        self.lib.enable_stats()
+        self.lib.create_series()
+        stats = self.lib._stats
+        before = stats.snapshot()
+        self.lib.disable_stats()
+        self.assertEqual(self.lib.stats(), {})
+        self.lib.create_series()
+        self.lib.add_media(self.media_path, MediaType.Image)
+        self.assertEqual(stats.snapshot(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()